@@ -0,0 +1,90 @@
+# Copyright 2025 Robert Srinivasiah
+# Licensed under the MIT License, see the LICENSE file for more info
+
+"""
+Shared TOML loading for the rsbl setup scripts.
+
+Parsed configs are memoized in memory, keyed by path, modification time and
+size, so repeated loads within a process are free. Each parse is also written
+to a JSON sidecar next to the TOML file (e.g. asset_listing.toml.cache.json),
+which later processes load instead of re-parsing the TOML while it is
+unchanged.
+"""
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+# Try to import tomllib (Python 3.11+) or tomli as fallback
+try:
+    import tomllib
+except ModuleNotFoundError:
+    try:
+        import tomli as tomllib
+    except ModuleNotFoundError:
+        print("ERROR: Neither tomllib (Python 3.11+) nor tomli package found.")
+        print("Please upgrade to Python 3.11+ or install tomli: pip install tomli")
+        sys.exit(1)
+
+SIDECAR_SUFFIX = ".cache.json"
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _load_sidecar(sidecar, stat):
+    """Return the cached parse from the sidecar if it matches the TOML file."""
+    try:
+        with open(sidecar, 'rb') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get('mtime_ns') != stat.st_mtime_ns or entry.get('size') != stat.st_size:
+        return None
+    return entry.get('data')
+
+
+def _write_sidecar(sidecar, stat, data):
+    """Best effort: values JSON can't represent, or a read-only tree, just skip it."""
+    entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'data': data}
+    temp_file = sidecar.with_name(sidecar.name + '.tmp')
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temp_file, sidecar)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+
+
+def load_toml(path):
+    """
+    Load and parse a TOML file, reusing an earlier parse while it is unchanged.
+
+    The returned dict is shared between callers and must be treated as read-only.
+    Raises OSError if the file can't be read and tomllib.TOMLDecodeError if it
+    isn't valid TOML.
+    """
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    sidecar = path.with_name(path.name + SIDECAR_SUFFIX)
+    data = _load_sidecar(sidecar, stat)
+    if data is None:
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+        _write_sidecar(sidecar, stat, data)
+
+    with _cache_lock:
+        _cache[key] = data
+    return data
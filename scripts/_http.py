@@ -0,0 +1,347 @@
+# Copyright 2025 Robert Srinivasiah
+# Licensed under the MIT License, see the LICENSE file for more info
+
+"""
+Shared HTTP helpers for the rsbl download scripts.
+
+Keeps a process-wide pool of keep-alive connections per host, so repeated
+requests to github.com / raw.githubusercontent.com reuse an open socket instead
+of paying for a fresh TCP + TLS handshake on every file.
+
+Proxies configured through HTTP_PROXY / HTTPS_PROXY / NO_PROXY (or the system
+settings urllib reads) are honored, like urllib.request does.
+
+Only the standard library is used, since these scripts run on the bare Python
+that setup_build_env.sh downloads.
+"""
+
+import base64
+import contextlib
+import http.client
+import os
+import shutil
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+USER_AGENT = "rsbl-scripts"
+TIMEOUT = 60  # seconds
+MAX_REDIRECTS = 10
+
+# Retry policy for connection errors and transient server errors
+RETRIES = 5
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (502, 503, 504)
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# Read/write chunk when streaming response bodies to disk. Larger than
+# shutil's default so multi-MB files take a handful of loop iterations.
+COPY_BUFFER_SIZE = 1 << 20
+
+# Files at least this large are fetched over several connections at once, one
+# byte range each, when the server supports it. Below this the extra requests
+# cost more than a single connection's slow start.
+RANGED_MIN_SIZE = 20 << 20
+RANGED_CONNECTIONS = 4
+
+
+class HTTPStatusError(Exception):
+    """Raised when a request finishes with an error status (4xx/5xx)."""
+
+    def __init__(self, url, status, reason, headers):
+        super().__init__(f"HTTP Error {status}: {reason}")
+        self.url = url
+        self.status = status
+        self.headers = headers
+
+
+class RangeNotSupported(Exception):
+    """Raised when a server answers a Range request with the whole file."""
+
+
+class ConnectionPool:
+    """Thread-safe pool of idle keep-alive connections, keyed by host."""
+
+    def __init__(self, maxsize=10):
+        self.maxsize = maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme, netloc, proxy=None):
+        """
+        Return an idle connection to the host, or open a new one.
+
+        With a proxy (see _proxy_for), https connections are tunneled through it
+        with CONNECT and http connections are made to the proxy itself.
+        """
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+
+        if proxy is None:
+            if scheme == 'https':
+                return http.client.HTTPSConnection(netloc, timeout=TIMEOUT)
+            return http.client.HTTPConnection(netloc, timeout=TIMEOUT)
+
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=TIMEOUT)
+            conn.set_tunnel(netloc, headers=_proxy_headers(proxy))
+            return conn
+        return http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=TIMEOUT)
+
+    def release(self, scheme, netloc, conn, response):
+        """Hand a connection back once its response is finished with."""
+        if not response.isclosed():
+            # Body wasn't fully read, so the socket can't carry another request
+            conn.close()
+            return
+
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+
+        conn.close()
+
+
+_POOL = ConnectionPool(maxsize=10)
+
+
+def _proxy_for(scheme, netloc):
+    """Return the split proxy URL to reach netloc through, or None to connect directly."""
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(netloc):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    return urllib.parse.urlsplit(proxy)
+
+
+def _proxy_headers(proxy):
+    """Return the Proxy-Authorization header for credentials in the proxy URL, if any."""
+    if proxy.username is None:
+        return {}
+    credentials = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode()).decode()}
+
+
+def _send(method, parts, headers):
+    """Send one request (no redirects), retrying transient failures."""
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+
+    proxy = _proxy_for(parts.scheme, parts.netloc)
+    if proxy is not None and parts.scheme == 'http':
+        # Plain http goes to the proxy itself, which needs the absolute URL
+        path = urllib.parse.urlunsplit(parts._replace(fragment=''))
+        headers = {**headers, **_proxy_headers(proxy)}
+
+    for attempt in range(RETRIES + 1):
+        if attempt:
+            time.sleep(BACKOFF_FACTOR * (2 ** (attempt - 1)))
+
+        conn = _POOL.acquire(parts.scheme, parts.netloc, proxy)
+        try:
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Covers stale keep-alive sockets the server already closed
+            conn.close()
+            if attempt == RETRIES:
+                raise
+            continue
+
+        if response.status in RETRY_STATUSES and attempt < RETRIES:
+            response.read()
+            _POOL.release(parts.scheme, parts.netloc, conn, response)
+            continue
+
+        return conn, response
+
+
+@contextlib.contextmanager
+def urlopen(url, method='GET', headers=None):
+    """
+    Open url through the shared connection pool, following redirects.
+
+    Yields the http.client.HTTPResponse. Raises HTTPStatusError for 4xx/5xx
+    responses; other statuses (2xx, 304) are left to the caller to inspect.
+    """
+    request_headers = {'User-Agent': USER_AGENT}
+    request_headers.update(headers or {})
+
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        conn, response = _send(method, parts, request_headers)
+
+        if response.status not in REDIRECT_STATUSES:
+            break
+
+        location = response.getheader('Location')
+        response.read()
+        _POOL.release(parts.scheme, parts.netloc, conn, response)
+
+        url = urllib.parse.urljoin(url, location)
+        if urllib.parse.urlsplit(url).netloc != parts.netloc:
+            # Never forward credentials to a different host
+            request_headers.pop('Authorization', None)
+    else:
+        raise http.client.HTTPException(f"Too many redirects: {url}")
+
+    try:
+        if response.status >= 400:
+            raise HTTPStatusError(url, response.status, response.reason, response.headers)
+        yield response
+    finally:
+        if response.length == 0:
+            # HEAD / 304 etc: nothing to read, but this marks the response complete
+            response.read()
+        _POOL.release(parts.scheme, parts.netloc, conn, response)
+
+
+def download(url, destination, headers=None, resume=False):
+    """
+    Stream url to the destination file through the shared connection pool.
+
+    With resume=True, an existing partial destination is continued with an
+    HTTP Range request. A server that ignores the range (200) restarts the
+    file from scratch.
+
+    Returns the response headers, or None if a conditional request was
+    answered with 304 Not Modified and the destination was left untouched.
+    """
+    have = 0
+    request_headers = dict(headers or {})
+    if resume and os.path.exists(destination):
+        have = os.path.getsize(destination)
+    if have:
+        request_headers['Range'] = f'bytes={have}-'
+
+    try:
+        with urlopen(url, headers=request_headers) as response:
+            if response.status == 304:
+                return None
+
+            if response.status == 206:
+                content_range = response.getheader('Content-Range', '')
+                if not content_range.startswith(f'bytes {have}-'):
+                    raise http.client.HTTPException(f"Unexpected Content-Range: {content_range}")
+                mode = 'ab'
+            else:
+                mode = 'wb'
+
+            with open(destination, mode) as f:
+                shutil.copyfileobj(response, f, COPY_BUFFER_SIZE)
+
+            return response.headers
+    except HTTPStatusError as e:
+        if e.status != 416 or not have:
+            raise
+
+        # The range starts at or past the end of the resource. If the sizes
+        # agree the previous run finished the file, otherwise start over.
+        total = e.headers.get('Content-Range', '').rpartition('/')[2]
+        if total == str(have):
+            return e.headers
+
+        os.remove(destination)
+        return download(url, destination, headers)
+
+
+def _download_range(url, path, start, end, progress, index):
+    """
+    Fetch bytes start..end (inclusive) of url into the same span of path.
+
+    progress[index] is kept at the number of bytes written so far, so a failed
+    download knows how much of the file arrived intact.
+    """
+    with urlopen(url, headers={'Range': f'bytes={start}-{end}'}) as response:
+        if response.status != 206:
+            raise RangeNotSupported(url)
+
+        with open(path, 'r+b') as f:
+            f.seek(start)
+            while chunk := response.read(COPY_BUFFER_SIZE):
+                f.write(chunk)
+                progress[index] += len(chunk)
+
+    if progress[index] != end - start + 1:
+        raise http.client.HTTPException(f"Short read for bytes {start}-{end}")
+
+
+def download_ranged(url, destination, connections=RANGED_CONNECTIONS, min_size=RANGED_MIN_SIZE):
+    """
+    Download url over several parallel connections, one byte range each.
+
+    Costs an extra HEAD request up front, so only use it for files expected to
+    be large. Falls back to a single-stream download() when the HEAD fails, the
+    server doesn't advertise byte ranges or the file is smaller than min_size.
+    Returns the response headers like download().
+
+    The ranges are written into a preallocated <destination>.ranged file,
+    which only becomes the destination once every range has arrived, so a
+    killed process never leaves a full-size file with holes behind. If the
+    download fails, the leading bytes that did arrive (all finished ranges
+    before the first unfinished one, plus that range's progress) are kept as
+    the destination, for download(resume=True) to continue.
+    """
+    try:
+        with urlopen(url, method='HEAD') as response:
+            headers = response.headers
+            length = int(response.getheader('Content-Length') or 0)
+            accepts_ranges = response.getheader('Accept-Ranges') == 'bytes'
+    except (HTTPStatusError, http.client.HTTPException):
+        # Some servers reject HEAD (405/403) but serve GET just fine
+        return download(url, destination)
+
+    if not accepts_ranges or length < min_size:
+        return download(url, destination)
+
+    # Preallocate, then let every worker write its own span in place
+    ranged_path = f"{destination}.ranged"
+    with open(ranged_path, 'wb') as f:
+        f.truncate(length)
+
+    chunk_size = -(-length // connections)
+    ranges = [(start, min(start + chunk_size, length) - 1) for start in range(0, length, chunk_size)]
+    progress = [0] * len(ranges)
+
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [executor.submit(_download_range, url, ranged_path, start, end, progress, i)
+                       for i, (start, end) in enumerate(ranges)]
+            for future in futures:
+                future.result()
+    except RangeNotSupported:
+        os.remove(ranged_path)
+        return download(url, destination)
+    except BaseException:
+        # The executor has waited for every worker, so progress is final here
+        _keep_prefix(ranged_path, destination, ranges, progress)
+        raise
+
+    os.replace(ranged_path, destination)
+    return headers
+
+
+def _keep_prefix(ranged_path, destination, ranges, progress):
+    """Cut a failed ranged download back to its contiguous start and move it to destination."""
+    intact = 0
+    for (start, end), written in zip(ranges, progress):
+        intact += written
+        if written != end - start + 1:
+            break
+
+    if not intact:
+        os.remove(ranged_path)
+        return
+
+    with open(ranged_path, 'r+b') as f:
+        f.truncate(intact)
+    os.replace(ranged_path, destination)
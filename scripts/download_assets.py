@@ -10,23 +10,40 @@ Supports two types of downloads:
 - gltf: Directory download with all associated files (textures, etc.)
 """
 
+import datetime
+import email.utils
+import hashlib
+import json
 import os
 import sys
-import urllib.request
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import re
 
-# Try to import tomllib (Python 3.11+) or tomli as fallback
-try:
-    import tomllib
-except ModuleNotFoundError:
-    try:
-        import tomli as tomllib
-    except ModuleNotFoundError:
-        print("ERROR: Neither tomllib (Python 3.11+) nor tomli package found.")
-        print("Please upgrade to Python 3.11+ or install tomli: pip install tomli")
-        sys.exit(1)
+import _http
+from _config_cache import load_toml
+
+# Number of concurrent downloads, both across assets and across the files of a
+# single glTF directory. Downloads are pure network I/O, so threads overlap the
+# per-request latency without contending on the GIL.
+DOWNLOAD_WORKERS = 8
+
+# GitHub API rate limiting. Unauthenticated requests get 60 per hour; setting
+# GITHUB_TOKEN raises that to 5000. Waits longer than the cap fail instead of
+# stalling the whole run until the quota resets.
+GITHUB_API_ATTEMPTS = 3
+MAX_RATE_LIMIT_WAIT = 120  # seconds
+
+# Cached GitHub directory listings are trusted outright for this long. After
+# that they are revalidated with a conditional request, and a 304 answer
+# doesn't count against the rate limit.
+GITHUB_LISTING_TTL = 24 * 60 * 60  # seconds
+
+# Path of a GitHub tree URL: /user/repo/tree/branch/path
+_GITHUB_TREE_PATH_RE = re.compile(r'^/([^/]+)/([^/]+)/tree/([^/]+)/(.+)$')
 
 
 # ANSI color codes
@@ -39,35 +56,113 @@ class Colors:
     NC = '\033[0m'  # No Color
 
 
+# Downloads run on worker threads, so serialize output to keep lines intact
+_print_lock = threading.Lock()
+
+
+def print_line(text=''):
+    with _print_lock:
+        print(text)
+
+
 def print_header(text):
-    print(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
-    print(f"{Colors.CYAN}{text}{Colors.NC}")
-    print(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
+    print_line(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
+    print_line(f"{Colors.CYAN}{text}{Colors.NC}")
+    print_line(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
 
 
 def print_success(text):
-    print(f"{Colors.GREEN}[OK] {text}{Colors.NC}")
+    print_line(f"{Colors.GREEN}[OK] {text}{Colors.NC}")
 
 
 def print_info(text):
-    print(f"{Colors.YELLOW}{text}{Colors.NC}")
+    print_line(f"{Colors.YELLOW}{text}{Colors.NC}")
 
 
 def print_error(text):
-    print(f"{Colors.RED}[ERROR] {text}{Colors.NC}")
+    print_line(f"{Colors.RED}[ERROR] {text}{Colors.NC}")
 
 
 def print_gray(text):
-    print(f"{Colors.GRAY}  {text}{Colors.NC}")
-
-
-def download_file(url, destination):
-    """Download a single file from URL to destination."""
+    print_line(f"{Colors.GRAY}  {text}{Colors.NC}")
+
+
+class DownloadManifest:
+    """
+    Records the ETag / Last-Modified / size of every downloaded file, so reruns
+    can ask the server whether a file changed instead of fetching it again.
+
+    Stored as JSON in sample_assets/.manifest.json, keyed by the path relative
+    to sample_assets/. Safe to use from multiple download threads.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = Path(root_dir)
+        self.manifest_file = self.root_dir / ".manifest.json"
+        self._lock = threading.Lock()
+
+        try:
+            with open(self.manifest_file, 'rb') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _key(self, destination):
+        return Path(destination).relative_to(self.root_dir).as_posix()
+
+    def conditional_headers(self, destination):
+        """Return validator headers if the local copy matches what was recorded."""
+        with self._lock:
+            entry = self.entries.get(self._key(destination))
+
+        if not entry or not os.path.exists(destination):
+            return {}
+        if os.path.getsize(destination) != entry['content_length']:
+            return {}
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record(self, destination, response_headers):
+        """Remember the validators for a freshly downloaded file."""
+        entry = {
+            'etag': response_headers.get('ETag'),
+            'content_length': os.path.getsize(destination),
+            'last_modified': response_headers.get('Last-Modified'),
+        }
+        with self._lock:
+            self.entries[self._key(destination)] = entry
+
+    def save(self):
+        """Write the manifest back to disk."""
+        temp_file = self.manifest_file.with_suffix('.tmp')
+        with self._lock:
+            with open(temp_file, 'w') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(temp_file, self.manifest_file)
+
+
+def download_file(url, destination, manifest=None):
+    """Download a single file from URL to destination, skipping it if unchanged."""
     try:
-        print_info(f"Downloading: {os.path.basename(destination)}")
+        headers = manifest.conditional_headers(destination) if manifest else {}
+        if headers:
+            print_info(f"Checking: {os.path.basename(destination)}")
+        else:
+            print_info(f"Downloading: {os.path.basename(destination)}")
         print_gray(f"From: {url}")
 
-        urllib.request.urlretrieve(url, destination)
+        response_headers = _http.download(url, destination, headers=headers)
+        if response_headers is None:
+            print_success(f"{os.path.basename(destination)} is up-to-date")
+            return True
+
+        if manifest:
+            manifest.record(destination, response_headers)
 
         file_size = os.path.getsize(destination)
         size_kb = file_size / 1024
@@ -78,36 +173,166 @@ def download_file(url, destination):
         return False
 
 
-def get_github_raw_url(tree_url):
-    """Convert GitHub tree URL to raw content base URL."""
-    # Example: https://github.com/user/repo/tree/branch/path
-    # To: https://raw.githubusercontent.com/user/repo/branch/path
+def _parse_github_tree(tree_url):
+    """
+    Convert a GitHub tree URL to (api_url, raw_base_url), or (None, None).
 
-    match = re.match(r'https://github\.com/([^/]+)/([^/]+)/tree/([^/]+)/(.+)', tree_url)
-    if match:
-        user, repo, branch, path = match.groups()
-        return f"https://raw.githubusercontent.com/{user}/{repo}/{branch}/{path}"
-    return None
+    Example: https://github.com/user/repo/tree/branch/path
+    API URL: https://api.github.com/repos/user/repo/contents/path?ref=branch
+    Raw URL: https://raw.githubusercontent.com/user/repo/branch/path
+    """
+    parts = urllib.parse.urlsplit(tree_url)
+    if parts.scheme != 'https' or parts.netloc != 'github.com':
+        return None, None
 
+    match = _GITHUB_TREE_PATH_RE.match(parts.path.rstrip('/'))
+    if not match:
+        return None, None
 
-def get_github_api_url(tree_url):
-    """Convert GitHub tree URL to API URL for listing directory contents."""
-    # Example: https://github.com/user/repo/tree/branch/path
-    # To: https://api.github.com/repos/user/repo/contents/path?ref=branch
+    user, repo, branch, path = match.groups()
+    api_url = f"https://api.github.com/repos/{user}/{repo}/contents/{path}?ref={branch}"
+    raw_base_url = f"https://raw.githubusercontent.com/{user}/{repo}/{branch}/{path}"
+    return api_url, raw_base_url
 
-    match = re.match(r'https://github\.com/([^/]+)/([^/]+)/tree/([^/]+)/(.+)', tree_url)
-    if match:
-        user, repo, branch, path = match.groups()
-        return f"https://api.github.com/repos/{user}/{repo}/contents/{path}?ref={branch}"
-    return None
 
+class RateLimitExceeded(RuntimeError):
+    """Raised when the GitHub API quota is used up for longer than we are willing to wait."""
+
+
+# Epoch time at which the GitHub API quota resets, once a response has reported
+# it exhausted. Shared by all download threads.
+_rate_limit_reset = 0.0
+_rate_limit_lock = threading.Lock()
+
+
+def _note_rate_limit(headers):
+    """Remember the quota reset time if a response says the quota is used up."""
+    global _rate_limit_reset
+
+    if headers.get('X-RateLimit-Remaining') == '0':
+        with _rate_limit_lock:
+            _rate_limit_reset = max(_rate_limit_reset, float(headers.get('X-RateLimit-Reset', 0)))
+
+
+def _rate_limit_wait(seconds):
+    """Sleep for a rate limit back-off, or fail if it would take too long."""
+    if seconds > MAX_RATE_LIMIT_WAIT:
+        raise RateLimitExceeded(f"GitHub API rate limit exceeded, resets in {seconds:.0f}s. "
+                           "Set GITHUB_TOKEN to raise the limit.")
+    if seconds > 0:
+        print_info(f"GitHub API rate limited, waiting {seconds:.0f}s...")
+        time.sleep(seconds)
 
-def download_gltf_directory(tree_url, destination_dir):
-    """Download entire glTF directory from GitHub."""
-    import json
 
-    api_url = get_github_api_url(tree_url)
-    raw_base_url = get_github_raw_url(tree_url)
+def _retry_after_seconds(value):
+    """Parse a Retry-After value (delay-seconds or HTTP-date), or None if it is neither."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        # HTTP-dates are always GMT
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return when.timestamp() - time.time()
+
+
+def _github_api_get(url, headers=None):
+    """
+    GET a GitHub API URL, honoring its rate limit headers.
+
+    Returns (status, headers, body). Sends GITHUB_TOKEN as a bearer token when set.
+    """
+    headers = {'Accept': 'application/vnd.github+json', **(headers or {})}
+    token = os.environ.get('GITHUB_TOKEN')
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+
+    for attempt in range(GITHUB_API_ATTEMPTS):
+        _rate_limit_wait(_rate_limit_reset - time.time())
+
+        try:
+            with _http.urlopen(url, headers=headers) as response:
+                _note_rate_limit(response.headers)
+                return response.status, response.headers, response.read()
+        except _http.HTTPStatusError as e:
+            retry_after = e.headers.get('Retry-After')
+            rate_limited = (e.status == 429 or retry_after is not None
+                            or e.headers.get('X-RateLimit-Remaining') == '0')
+            if not rate_limited:
+                raise
+            if attempt == GITHUB_API_ATTEMPTS - 1:
+                raise RateLimitExceeded(f"GitHub API rate limit exceeded: {e}") from e
+
+            _note_rate_limit(e.headers)
+            delay = _retry_after_seconds(retry_after) if retry_after else None
+            if delay is not None:
+                _rate_limit_wait(delay)
+            elif e.status == 429:
+                _rate_limit_wait(2 ** attempt)
+
+
+def get_github_listing(api_url, cache_dir=None):
+    """
+    Return the GitHub contents listing for api_url.
+
+    With a cache_dir, listings are cached on disk along with their ETag, so
+    reruns skip the request while the entry is fresh and revalidate it with
+    If-None-Match once it is stale.
+    """
+    cache_file = None
+    cached = None
+    headers = {}
+    if cache_dir is not None:
+        cache_file = Path(cache_dir) / f"{hashlib.sha1(api_url.encode()).hexdigest()}.json"
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = None
+
+    if cached:
+        if time.time() - cached['fetched_at'] < GITHUB_LISTING_TTL:
+            print_gray("Using cached directory listing")
+            return cached['files']
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+
+    try:
+        status, response_headers, body = _github_api_get(api_url, headers)
+    except RateLimitExceeded as e:
+        if not cached:
+            raise
+        # An outdated listing beats failing the asset outright
+        print_info(f"{e}")
+        print_gray("Using stale cached directory listing")
+        return cached['files']
+
+    if status == 304:
+        print_gray("Cached directory listing is still current")
+        files = cached['files']
+        etag = cached['etag']
+    else:
+        files = json.loads(body)
+        etag = response_headers.get('ETag')
+
+    if cache_file is not None and isinstance(files, list):
+        # Write then rename, so a concurrent reader never sees a partial file
+        temp_file = cache_file.with_suffix('.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump({'etag': etag, 'fetched_at': time.time(), 'files': files}, f)
+        os.replace(temp_file, cache_file)
+
+    return files
+
+
+def download_gltf_directory(tree_url, destination_dir, cache_dir=None, manifest=None):
+    """Download entire glTF directory from GitHub."""
+    api_url, raw_base_url = _parse_github_tree(tree_url)
 
     if not api_url or not raw_base_url:
         print_error(f"Invalid GitHub URL format: {tree_url}")
@@ -118,30 +343,50 @@ def download_gltf_directory(tree_url, destination_dir):
         print_gray(f"API URL: {api_url}")
 
         # Get directory listing from GitHub API
-        with urllib.request.urlopen(api_url) as response:
-            files = json.loads(response.read().decode())
+        files = get_github_listing(api_url, cache_dir)
 
         if not isinstance(files, list):
             print_error("Unexpected API response format")
             return False
 
-        success = True
-        for file_info in files:
-            if file_info['type'] == 'file':
-                file_name = file_info['name']
-                file_url = f"{raw_base_url}/{file_name}"
-                file_dest = os.path.join(destination_dir, file_name)
+        # Files are independent, so fetch them concurrently over the shared pool
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = []
+            for file_info in files:
+                if file_info['type'] == 'file':
+                    file_name = file_info['name']
+                    file_url = f"{raw_base_url}/{file_name}"
+                    file_dest = os.path.join(destination_dir, file_name)
 
-                if not download_file(file_url, file_dest):
-                    success = False
+                    futures.append(executor.submit(download_file, file_url, file_dest, manifest))
+
+            results = [future.result() for future in futures]
 
-        return success
+        return all(results)
 
     except Exception as e:
         print_error(f"Failed to download directory: {e}")
         return False
 
 
+def download_asset(name, asset, asset_dest_dir, cache_dir=None, manifest=None):
+    """Download a single asset entry into asset_dest_dir."""
+    url = asset['url']
+    asset_type = asset.get('type', 'glb')
+
+    if asset_type == 'glb':
+        # Single file download
+        file_name = f"{name}.glb"
+        dest_file = asset_dest_dir / file_name
+        return download_file(url, dest_file, manifest)
+    elif asset_type == 'gltf':
+        # Directory download
+        return download_gltf_directory(url, asset_dest_dir, cache_dir, manifest)
+
+    print_error(f"Unknown asset type for {name}: {asset_type}")
+    return False
+
+
 def download_assets():
     """Main function to download all assets from asset_listing.toml."""
 
@@ -162,8 +407,7 @@ def download_assets():
     # Load TOML
     print_info(f"Loading asset listing from: {toml_file}")
     try:
-        with open(toml_file, 'rb') as f:
-            config = tomllib.load(f)
+        config = load_toml(toml_file)
     except Exception as e:
         print_error(f"Failed to parse TOML: {e}")
         return 1
@@ -179,8 +423,16 @@ def download_assets():
     # Create assets directory
     assets_dir.mkdir(exist_ok=True)
 
-    # Download each asset
+    # GitHub directory listings are cached between runs
+    listing_cache_dir = assets_dir / ".cache" / "gh_api"
+    listing_cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # Validators for previously downloaded files, so unchanged ones are skipped
+    manifest = DownloadManifest(assets_dir)
+
+    # Describe each asset up front, then download them all concurrently
     failed_assets = []
+    pending = []
     for i, asset in enumerate(assets, 1):
         name = asset.get('name', f'asset_{i}')
         url = asset.get('url')
@@ -201,26 +453,34 @@ def download_assets():
             print()
             continue
 
-        # Create category subdirectory
         asset_dest_dir = assets_dir / category / name
+        pending.append((name, asset, asset_dest_dir))
+
+    # Create each category/asset subdirectory once, before any worker starts
+    for asset_dest_dir in sorted({asset_dest_dir for _, _, asset_dest_dir in pending}):
         asset_dest_dir.mkdir(parents=True, exist_ok=True)
 
-        success = False
-        if asset_type == 'glb':
-            # Single file download
-            file_name = f"{name}.glb"
-            dest_file = asset_dest_dir / file_name
-            success = download_file(url, dest_file)
-        elif asset_type == 'gltf':
-            # Directory download
-            success = download_gltf_directory(url, asset_dest_dir)
-        else:
-            print_error(f"Unknown asset type: {asset_type}")
-            failed_assets.append(name)
+    if pending:
+        print_info(f"Downloading {len(pending)} asset(s) with {DOWNLOAD_WORKERS} workers...")
+        print()
 
-        if not success:
-            failed_assets.append(name)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = [(name, executor.submit(download_asset, name, asset, asset_dest_dir,
+                                              listing_cache_dir, manifest))
+                       for name, asset, asset_dest_dir in pending]
+
+            # Collect in listing order so the summary is stable across runs
+            for name, future in futures:
+                try:
+                    success = future.result()
+                except Exception as e:
+                    print_error(f"Failed to download {name}: {e}")
+                    success = False
+
+                if not success:
+                    failed_assets.append(name)
 
+        manifest.save()
         print()
 
     # Summary
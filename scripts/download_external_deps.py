@@ -8,24 +8,24 @@ Download external dependencies defined in external_deps.toml.
 Downloads release archives and extracts them to external/{name}/ directory.
 """
 
+import hashlib
+import json
 import os
 import sys
-import urllib.request
 import shutil
+import threading
+import time
 import zipfile
 import tarfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# Try to import tomllib (Python 3.11+) or tomli as fallback
-try:
-    import tomllib
-except ModuleNotFoundError:
-    try:
-        import tomli as tomllib
-    except ModuleNotFoundError:
-        print("ERROR: Neither tomllib (Python 3.11+) nor tomli package found.")
-        print("Please upgrade to Python 3.11+ or install tomli: pip install tomli")
-        sys.exit(1)
+import _http
+from _config_cache import load_toml
+
+# Number of dependencies processed concurrently. Each worker downloads and then
+# extracts one dependency, so one archive's extraction overlaps the next download.
+DEPENDENCY_WORKERS = 4
 
 
 # ANSI color codes
@@ -38,59 +38,135 @@ class Colors:
     NC = '\033[0m'  # No Color
 
 
+# Dependencies are processed on worker threads, so serialize output to keep lines intact
+_print_lock = threading.Lock()
+
+
+def print_line(text=''):
+    with _print_lock:
+        print(text)
+
+
 def print_header(text):
-    print(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
-    print(f"{Colors.CYAN}{text}{Colors.NC}")
-    print(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
+    print_line(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
+    print_line(f"{Colors.CYAN}{text}{Colors.NC}")
+    print_line(f"{Colors.CYAN}{'=' * 60}{Colors.NC}")
 
 
 def print_success(text):
-    print(f"{Colors.GREEN}[OK] {text}{Colors.NC}")
+    print_line(f"{Colors.GREEN}[OK] {text}{Colors.NC}")
 
 
 def print_info(text):
-    print(f"{Colors.YELLOW}{text}{Colors.NC}")
+    print_line(f"{Colors.YELLOW}{text}{Colors.NC}")
 
 
 def print_error(text):
-    print(f"{Colors.RED}[ERROR] {text}{Colors.NC}")
+    print_line(f"{Colors.RED}[ERROR] {text}{Colors.NC}")
 
 
 def print_gray(text):
-    print(f"{Colors.GRAY}  {text}{Colors.NC}")
+    print_line(f"{Colors.GRAY}  {text}{Colors.NC}")
+
+
+class DependencyCache:
+    """
+    Records which version of each dependency was extracted, and the BLAKE2b
+    digest of the archive it came from, in external/.deps_cache.json. An
+    archive downloaded again for the same version must match that digest.
+
+    An entry is written with extracted_at = None before extraction starts and
+    stamped once it finishes, so an interrupted extraction is redone on the
+    next run instead of being mistaken for a complete one. Safe to use from
+    multiple worker threads.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = Path(cache_file)
+        self._lock = threading.Lock()
+
+        try:
+            with open(self.cache_file, 'rb') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, name):
+        with self._lock:
+            return self.entries.get(name)
 
+    def update(self, name, **fields):
+        """Merge fields into the entry for name and write the cache to disk."""
+        with self._lock:
+            self.entries.setdefault(name, {}).update(fields)
 
-def download_file(url, destination):
-    """Download a file from URL to destination."""
+            temp_file = self.cache_file.with_suffix('.tmp')
+            with open(temp_file, 'w') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(temp_file, self.cache_file)
+
+
+def is_tar_archive(archive_name):
+    """Return True if the archive name looks like a gzipped tarball."""
+    return archive_name.endswith('.tar.gz') or archive_name.endswith('.tgz')
+
+
+def hash_file(path):
+    """Return the BLAKE2b hex digest of a file."""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+            return hashlib.file_digest(f, 'blake2b').hexdigest()
+
+        digest = hashlib.blake2b()
+        while chunk := f.read(_http.COPY_BUFFER_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def download_file(url, destination, ranged=False):
+    """
+    Download a file from URL to destination, resuming a partial download.
+
+    With ranged=True a fresh download is split across several connections when
+    the file is large enough (see _http.download_ranged).
+    """
     try:
         print_info(f"Downloading from: {url}")
-
-        urllib.request.urlretrieve(url, destination)
+        if os.path.exists(destination):
+            have_mb = os.path.getsize(destination) / (1024 * 1024)
+            print_gray(f"Resuming partial download ({have_mb:.2f} MB already present)")
+            _http.download(url, destination, resume=True)
+        elif ranged:
+            _http.download_ranged(url, destination)
+        else:
+            # GitHub source archives are streamed without a Content-Length and
+            # are far below _http.RANGED_MIN_SIZE, so probing for ranges would
+            # only cost an extra request
+            _http.download(url, destination)
 
         file_size = os.path.getsize(destination)
         size_mb = file_size / (1024 * 1024)
-        print_success(f"Downloaded ({size_mb:.2f} MB)")
+        print_success(f"Downloaded {url.split('/')[-1]} ({size_mb:.2f} MB)")
         return True
     except Exception as e:
-        print_error(f"Failed to download: {e}")
+        print_error(f"Failed to download {url}: {e}")
         return False
 
 
-def extract_archive(archive_path, dest_dir, strip_components=0):
-    """Extract an archive (zip or tar.gz) to destination directory."""
+def extract_archive(archive, archive_name, dest_dir, strip_components=0):
+    """Extract an archive (zip or tar.gz) file object to destination directory."""
     try:
-        archive_path = Path(archive_path)
         dest_dir = Path(dest_dir)
 
-        print_info(f"Extracting archive...")
+        print_info(f"Extracting {archive_name}...")
 
         # Determine archive type
-        if archive_path.suffix == '.zip' or archive_path.name.endswith('.zip'):
-            return extract_zip(archive_path, dest_dir, strip_components)
-        elif archive_path.name.endswith('.tar.gz') or archive_path.name.endswith('.tgz'):
-            return extract_tar(archive_path, dest_dir, strip_components)
+        if archive_name.endswith('.zip'):
+            return extract_zip(archive, dest_dir, strip_components)
+        elif is_tar_archive(archive_name):
+            return extract_tar(archive, dest_dir, strip_components)
         else:
-            print_error(f"Unsupported archive format: {archive_path.suffix}")
+            print_error(f"Unsupported archive format: {Path(archive_name).suffix}")
             return False
 
     except Exception as e:
@@ -98,9 +174,15 @@ def extract_archive(archive_path, dest_dir, strip_components=0):
         return False
 
 
-def extract_zip(archive_path, dest_dir, strip_components=0):
-    """Extract a zip archive."""
-    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+def extract_zip(archive, dest_dir, strip_components=0):
+    """Extract a zip archive. The file object must be seekable."""
+    with zipfile.ZipFile(archive, 'r') as zip_ref:
+        if strip_components == 0:
+            # Nothing to rewrite, let zipfile extract everything in one go
+            zip_ref.extractall(dest_dir)
+            print_success(f"Extracted to: {dest_dir}")
+            return True
+
         members = zip_ref.namelist()
 
         for member in members:
@@ -122,72 +204,121 @@ def extract_zip(archive_path, dest_dir, strip_components=0):
             else:
                 target_path.parent.mkdir(parents=True, exist_ok=True)
                 with zip_ref.open(member) as source, open(target_path, 'wb') as target:
-                    shutil.copyfileobj(source, target)
+                    shutil.copyfileobj(source, target, _http.COPY_BUFFER_SIZE)
 
     print_success(f"Extracted to: {dest_dir}")
     return True
 
 
-def extract_tar(archive_path, dest_dir, strip_components=0):
-    """Extract a tar archive."""
-    with tarfile.open(archive_path, 'r:*') as tar_ref:
-        members = tar_ref.getmembers()
+def _stripped_tar_members(tar_ref, strip_components):
+    """Yield tar members with their leading path components removed."""
+    for member in tar_ref:
+        # Split path and remove specified number of components
+        parts = member.name.split('/')
+        if len(parts) <= strip_components:
+            continue
+
+        new_path = '/'.join(parts[strip_components:])
+        if not new_path:
+            continue
 
-        for member in members:
-            # Split path and remove specified number of components
-            parts = member.name.split('/')
-            if len(parts) <= strip_components:
-                continue
+        # Update member name
+        member.name = new_path
+        yield member
 
-            new_path = '/'.join(parts[strip_components:])
-            if not new_path:
-                continue
 
-            # Update member name
-            member.name = new_path
-            tar_ref.extract(member, dest_dir)
+def extract_tar(archive, dest_dir, strip_components=0):
+    """Extract a tar archive, reading the file object as a forward-only stream."""
+    with tarfile.open(fileobj=archive, mode='r|*') as tar_ref:
+        if strip_components == 0:
+            tar_ref.extractall(dest_dir)
+        else:
+            tar_ref.extractall(dest_dir, members=_stripped_tar_members(tar_ref, strip_components))
 
     print_success(f"Extracted to: {dest_dir}")
     return True
 
 
-def download_dependency(name, url, version, dest_dir, strip_components=0):
+def download_dependency(name, url, version, dest_dir, strip_components=0, ranged=False, cache=None):
     """Download and extract a dependency."""
     dest_dir = Path(dest_dir)
+    entry = cache.get(name) if cache else None
 
     # Check if already exists
     if dest_dir.exists() and any(dest_dir.iterdir()):
-        print_success(f"{name} already exists at: {dest_dir}")
-        return True
+        if entry is None:
+            # Predates the cache, or was put there by hand: leave it alone
+            print_success(f"{name} already exists at: {dest_dir}")
+            return True
+
+        if entry.get('version') == version and entry.get('extracted_at'):
+            print_success(f"{name} {version} already exists at: {dest_dir}")
+            return True
+
+        # A different version, or an extraction that never finished
+        print_info(f"Replacing {name} at: {dest_dir}")
+        shutil.rmtree(dest_dir)
+
+    # Determine archive filename from URL
+    archive_name = url.split('/')[-1]
+    if not archive_name:
+        archive_name = f"{name}.zip"
+
+    # Archives are kept between runs until they have been extracted, so an
+    # interrupted download can be resumed instead of restarted. The .part
+    # suffix marks a download that hasn't completed yet.
+    downloads_dir = dest_dir.parent / ".downloads"
+    downloads_dir.mkdir(parents=True, exist_ok=True)
+    archive_path = downloads_dir / f"{name}-{archive_name}"
+    partial_path = downloads_dir / f"{name}-{archive_name}.part"
+
+    # A re-download of a version that was extracted before must be the same archive
+    expected_digest = entry.get('blake2b') if entry and entry.get('version') == version else None
+
+    for attempt in range(2):
+        if archive_path.exists():
+            print_success(f"Using previously downloaded archive: {archive_path.name}")
+        else:
+            if not download_file(url, partial_path, ranged):
+                return False
+            partial_path.replace(archive_path)
+
+        digest = hash_file(archive_path)
+        if expected_digest in (None, digest):
+            break
+
+        # Either the download is corrupt or the release was republished under
+        # the same version. Fetch it once more to tell the two apart.
+        archive_path.unlink()
+        if attempt == 0:
+            print_info(f"Archive for {name} {version} differs from the one extracted previously, downloading again")
+    else:
+        print_error(f"Archive for {name} {version} has changed since it was first extracted. "
+                    f"If that is expected, remove '{name}' from {cache.cache_file}")
+        return False
 
-    # Create temporary download directory
-    temp_dir = dest_dir.parent / f".{name}_download"
-    temp_dir.mkdir(parents=True, exist_ok=True)
+    if cache:
+        cache.update(name, version=version, blake2b=digest, extracted_at=None)
 
-    try:
-        # Determine archive filename from URL
-        archive_name = url.split('/')[-1]
-        if not archive_name:
-            archive_name = f"{name}.zip"
-        archive_path = temp_dir / archive_name
-
-        # Download
-        if not download_file(url, archive_path):
-            return False
+    # Create destination directory
+    dest_dir.mkdir(parents=True, exist_ok=True)
 
-        # Create destination directory
-        dest_dir.mkdir(parents=True, exist_ok=True)
+    with open(archive_path, 'rb') as archive:
+        extracted = extract_archive(archive, archive_name, dest_dir, strip_components)
 
-        # Extract
-        if not extract_archive(archive_path, dest_dir, strip_components):
-            return False
+    # Either way the archive is done with: a failed extraction most likely
+    # means it is corrupt, so fetch a fresh copy next time
+    archive_path.unlink()
 
-        return True
+    if not extracted:
+        # Don't leave a partial extraction behind to be mistaken for a complete one
+        shutil.rmtree(dest_dir, ignore_errors=True)
+        return False
+
+    if cache:
+        cache.update(name, extracted_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
 
-    finally:
-        # Clean up temp directory
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir)
+    return True
 
 
 def download_dependencies():
@@ -210,8 +341,7 @@ def download_dependencies():
     # Load TOML
     print_info(f"Loading dependencies from: {toml_file}")
     try:
-        with open(toml_file, 'rb') as f:
-            config = tomllib.load(f)
+        config = load_toml(toml_file)
     except Exception as e:
         print_error(f"Failed to parse TOML: {e}")
         return 1
@@ -231,13 +361,15 @@ def download_dependencies():
     print_success(f"Found {len(enabled_deps)} enabled dependenc{'y' if len(enabled_deps) == 1 else 'ies'}")
     print()
 
-    # Download each dependency
+    # Describe each dependency up front, then process them concurrently
     failed_deps = []
+    pending = []
     for i, dep in enumerate(enabled_deps, 1):
         name = dep.get('name', f'dep_{i}')
         url = dep.get('url')
         version = dep.get('version', 'unknown')
         strip_components = dep.get('strip_components', 0)
+        ranged = dep.get('ranged', False)
 
         print(f"{Colors.CYAN}--- Dependency {i}/{len(enabled_deps)}: {name} ---{Colors.NC}")
         print_gray(f"Version: {version}")
@@ -250,12 +382,33 @@ def download_dependencies():
             continue
 
         dest_dir = external_dir / name
+        pending.append((name, url, version, dest_dir, strip_components, ranged))
 
-        if not download_dependency(name, url, version, dest_dir, strip_components):
-            failed_deps.append(name)
+    # What was extracted by previous runs, so finished dependencies are skipped
+    cache = DependencyCache(external_dir / ".deps_cache.json")
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=DEPENDENCY_WORKERS) as executor:
+            futures = [(args[0], executor.submit(download_dependency, *args, cache)) for args in pending]
+
+            # Collect in listing order so the summary is stable across runs
+            for name, future in futures:
+                try:
+                    success = future.result()
+                except Exception as e:
+                    print_error(f"Failed to process {name}: {e}")
+                    success = False
+
+                if not success:
+                    failed_deps.append(name)
 
         print()
 
+    # Only interrupted downloads are left behind for the next run to resume
+    downloads_dir = external_dir / ".downloads"
+    if downloads_dir.exists() and not any(downloads_dir.iterdir()):
+        downloads_dir.rmdir()
+
     # Summary
     print_header("Download Summary")
     print()
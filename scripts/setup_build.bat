@@ -22,6 +22,15 @@ set SCRIPT_DIR=%~dp0
 set REPO_ROOT=%SCRIPT_DIR%..
 cd /d %REPO_ROOT%
 
+REM Local tool paths. setup_build_env.sh records which CMake it found or installed
+set CMAKE_PATH_FILE=%REPO_ROOT%\build_env\cmake\cmake_path.txt
+if not exist "%CMAKE_PATH_FILE%" (
+    echo ERROR: Local CMake not found, run scripts/setup_build_env.sh first
+    exit /b 1
+)
+set /p CMAKE_EXE=<"%CMAKE_PATH_FILE%"
+set NINJA_EXE=%REPO_ROOT%\build_env\ninja\ninja.exe
+
 REM Create build directory if it doesn't exist
 if not exist cmake-test-ninja (
     echo Creating build directory: cmake-test-ninja
@@ -32,7 +41,7 @@ REM Configure with CMake and Ninja
 echo.
 echo Configuring CMake with Ninja generator...
 cd cmake-test-ninja
-%REPO_ROOT%\build_env\cmake\cmake-4.1.2-windows-x86_64\bin\cmake.exe -G Ninja -DCMAKE_MAKE_PROGRAM=%REPO_ROOT%\build_env\ninja\ninja.exe ..
+"%CMAKE_EXE%" -G Ninja -DCMAKE_MAKE_PROGRAM="%NINJA_EXE%" ..
 if %ERRORLEVEL% neq 0 (
     echo ERROR: CMake configuration failed
     exit /b 1
@@ -41,7 +50,7 @@ if %ERRORLEVEL% neq 0 (
 REM Build all targets
 echo.
 echo Building all targets...
-%REPO_ROOT%\build_env\cmake\cmake-4.1.2-windows-x86_64\bin\cmake.exe --build .
+"%CMAKE_EXE%" --build .
 if %ERRORLEVEL% neq 0 (
     echo ERROR: Build failed
     exit /b 1
@@ -224,51 +224,115 @@ case "$OS" in
         ;;
 esac
 
-NEEDS_CMAKE=false
-
-# Check if local CMake already exists
-if [ -f "$LOCAL_CMAKE_EXE" ]; then
+NEEDS_CMAKE=true
+CMAKE_RESOLVED_FILE="$LOCAL_CMAKE_DIR/.resolved"
+
+# Reuse the executable found by a previous run, unless it has changed since
+if [ -f "$CMAKE_RESOLVED_FILE" ] && read -r RESOLVED_VERSION RESOLVED_EXE < "$CMAKE_RESOLVED_FILE" \
+    && [ "$RESOLVED_VERSION" = "$CMAKE_TARGET_VERSION" ] && [ -f "$RESOLVED_EXE" ] \
+    && ! [ "$RESOLVED_EXE" -nt "$CMAKE_RESOLVED_FILE" ]; then
+    LOCAL_CMAKE_EXE="$RESOLVED_EXE"
+    NEEDS_CMAKE=false
     echo -e "${GREEN}[OK] Local CMake installation found${NC}"
     echo -e "${GRAY}  Location: $LOCAL_CMAKE_EXE${NC}"
+    echo -e "${GRAY}  Version: cmake version $CMAKE_TARGET_VERSION${NC}"
+    echo ""
+fi
 
-    # Verify version
-    if VERSION_OUTPUT=$("$LOCAL_CMAKE_EXE" --version 2>&1 | head -n 1); then
-        echo -e "${GRAY}  Version: $VERSION_OUTPUT${NC}"
-        echo ""
-    else
-        echo -e "${YELLOW}[WARNING] Existing installation appears corrupted, re-downloading...${NC}"
-        rm -rf "$LOCAL_CMAKE_DIR"
-        NEEDS_CMAKE=true
-    fi
-else
-    NEEDS_CMAKE=true
+# Otherwise ask every extracted CMake for its version, so an install whose
+# directory name doesn't match the expected platform suffix is still found
+if [ "$NEEDS_CMAKE" = true ]; then
+    for CANDIDATE in "$LOCAL_CMAKE_DIR"/cmake-*/bin/cmake "$LOCAL_CMAKE_DIR"/cmake-*/bin/cmake.exe \
+                     "$LOCAL_CMAKE_DIR"/cmake-*/CMake.app/Contents/bin/cmake; do
+        [ -f "$CANDIDATE" ] || continue
+
+        # Native cmake.exe under Git Bash ends its lines with CRLF
+        VERSION_OUTPUT=$("$CANDIDATE" --version 2>/dev/null | head -n 1 | tr -d '\r') || true
+        if [ "$VERSION_OUTPUT" = "cmake version $CMAKE_TARGET_VERSION" ]; then
+            LOCAL_CMAKE_EXE="$CANDIDATE"
+            NEEDS_CMAKE=false
+            echo "$CMAKE_TARGET_VERSION $LOCAL_CMAKE_EXE" > "$CMAKE_RESOLVED_FILE"
+            echo -e "${GREEN}[OK] Local CMake installation found${NC}"
+            echo -e "${GRAY}  Location: $LOCAL_CMAKE_EXE${NC}"
+            echo -e "${GRAY}  Version: $VERSION_OUTPUT${NC}"
+            echo ""
+            break
+        fi
+    done
 fi
 
 if [ "$NEEDS_CMAKE" = true ]; then
     echo -e "${YELLOW}Downloading CMake $CMAKE_TARGET_VERSION to local directory...${NC}"
     echo ""
 
-    # Create local directory
+    # Create local directory, clearing out any broken copy of this version
     mkdir -p "$LOCAL_CMAKE_DIR"
+    rm -rf "$LOCAL_CMAKE_DIR/cmake-$CMAKE_TARGET_VERSION-$CMAKE_PLATFORM"
 
-    # Build download URL
-    CMAKE_DOWNLOAD_URL="https://github.com/Kitware/CMake/releases/download/v$CMAKE_TARGET_VERSION/cmake-$CMAKE_TARGET_VERSION-$CMAKE_PLATFORM.$CMAKE_ARCHIVE_EXT"
+    # Build download URLs
+    CMAKE_RELEASE_URL="https://github.com/Kitware/CMake/releases/download/v$CMAKE_TARGET_VERSION"
+    CMAKE_ARCHIVE_NAME="cmake-$CMAKE_TARGET_VERSION-$CMAKE_PLATFORM.$CMAKE_ARCHIVE_EXT"
+    CMAKE_DOWNLOAD_URL="$CMAKE_RELEASE_URL/$CMAKE_ARCHIVE_NAME"
+    CMAKE_CHECKSUMS_URL="$CMAKE_RELEASE_URL/cmake-$CMAKE_TARGET_VERSION-SHA-256.txt"
     CMAKE_ARCHIVE="$LOCAL_CMAKE_DIR/cmake-$CMAKE_TARGET_VERSION.$CMAKE_ARCHIVE_EXT"
 
-    echo -e "${GRAY}  Downloading from: $CMAKE_DOWNLOAD_URL${NC}"
-    echo ""
-
-    # Download
+    # Kitware publishes a SHA-256 list next to each release's archives
     if command -v curl &> /dev/null; then
-        curl -L -o "$CMAKE_ARCHIVE" "$CMAKE_DOWNLOAD_URL"
-    elif command -v wget &> /dev/null; then
-        wget -O "$CMAKE_ARCHIVE" "$CMAKE_DOWNLOAD_URL"
+        CMAKE_CHECKSUMS=$(curl -fsSL "$CMAKE_CHECKSUMS_URL" 2>/dev/null) || true
     else
-        echo -e "${RED}[ERROR] Neither curl nor wget found. Please install one of them.${NC}"
-        exit 1
+        CMAKE_CHECKSUMS=$(wget -qO- "$CMAKE_CHECKSUMS_URL" 2>/dev/null) || true
     fi
+    CMAKE_EXPECTED_SHA256=$(echo "$CMAKE_CHECKSUMS" | awk -v name="$CMAKE_ARCHIVE_NAME" '$2 == name { print $1 }')
 
-    echo -e "${GREEN}[OK] Download complete${NC}"
+    # Download, retrying once if the archive doesn't match its checksum
+    for CMAKE_ATTEMPT in 1 2; do
+        echo -e "${GRAY}  Downloading from: $CMAKE_DOWNLOAD_URL${NC}"
+        echo ""
+
+        # Continue an archive left by an interrupted run instead of starting
+        # over. No curl -f: it would turn the 416 for an already complete
+        # archive into an error, and the checksum below catches error pages.
+        if command -v curl &> /dev/null; then
+            curl -L -C - -o "$CMAKE_ARCHIVE" "$CMAKE_DOWNLOAD_URL"
+        elif command -v wget &> /dev/null; then
+            wget -c -O "$CMAKE_ARCHIVE" "$CMAKE_DOWNLOAD_URL"
+        else
+            echo -e "${RED}[ERROR] Neither curl nor wget found. Please install one of them.${NC}"
+            exit 1
+        fi
+
+        echo -e "${GREEN}[OK] Download complete${NC}"
+
+        if [ -z "$CMAKE_EXPECTED_SHA256" ]; then
+            echo -e "${YELLOW}[WARNING] Could not fetch CMake checksums, skipping verification${NC}"
+            break
+        fi
+
+        if command -v sha256sum &> /dev/null; then
+            CMAKE_ACTUAL_SHA256=$(sha256sum "$CMAKE_ARCHIVE" | awk '{ print $1 }')
+        elif command -v shasum &> /dev/null; then
+            CMAKE_ACTUAL_SHA256=$(shasum -a 256 "$CMAKE_ARCHIVE" | awk '{ print $1 }')
+        else
+            echo -e "${YELLOW}[WARNING] Neither sha256sum nor shasum found, skipping verification${NC}"
+            break
+        fi
+
+        if [ "$CMAKE_ACTUAL_SHA256" = "$CMAKE_EXPECTED_SHA256" ]; then
+            echo -e "${GREEN}[OK] Checksum verified${NC}"
+            break
+        fi
+
+        echo -e "${RED}[ERROR] Checksum mismatch for $CMAKE_ARCHIVE_NAME${NC}"
+        echo -e "${GRAY}  Expected: $CMAKE_EXPECTED_SHA256${NC}"
+        echo -e "${GRAY}  Actual:   $CMAKE_ACTUAL_SHA256${NC}"
+        rm -f "$CMAKE_ARCHIVE"
+
+        if [ "$CMAKE_ATTEMPT" = 2 ]; then
+            exit 1
+        fi
+        echo -e "${YELLOW}Retrying download...${NC}"
+        echo ""
+    done
 
     # Extract
     echo -e "${YELLOW}Extracting to $LOCAL_CMAKE_DIR...${NC}"
@@ -303,6 +367,8 @@ if [ "$NEEDS_CMAKE" = true ]; then
         echo -e "${YELLOW}Testing installation...${NC}"
         "$LOCAL_CMAKE_EXE" --version | head -n 1
         echo ""
+
+        echo "$CMAKE_TARGET_VERSION $LOCAL_CMAKE_EXE" > "$CMAKE_RESOLVED_FILE"
     else
         echo ""
         echo -e "${RED}[ERROR] CMake executable not found at expected location${NC}"
@@ -311,6 +377,14 @@ if [ "$NEEDS_CMAKE" = true ]; then
     fi
 fi
 
+# setup_build.bat runs from cmd, which can't use the MSYS path above, so also
+# record the Windows form of whichever CMake was found (CRLF for set /p)
+case "$OS" in
+    MINGW*|MSYS*|CYGWIN*)
+        printf '%s\r\n' "$(cygpath -w "$LOCAL_CMAKE_EXE")" > "$LOCAL_CMAKE_DIR/cmake_path.txt"
+        ;;
+esac
+
 # ============================================================
 # Ninja Setup
 # ============================================================
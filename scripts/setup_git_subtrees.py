@@ -6,21 +6,38 @@ Git subtree setup script for rsbl.
 Manages remote dependencies as git subtrees.
 """
 
+import io
 import os
 import sys
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional
 
+from _config_cache import load_toml
+
 try:
-    import tomllib
-except ImportError:
-    try:
-        import tomli as tomllib
-    except ImportError:
-        print("[ERROR] TOML support not available.")
-        print("Please install tomli: pip install tomli")
-        sys.exit(1)
+    import pygit2
+except ModuleNotFoundError:
+    # Optional: without the libgit2 bindings, remotes are managed with the git CLI
+    pygit2 = None
+
+# Remote fetches run side by side, at most this many at once
+FETCH_WORKERS = 4
+
+# Minimum seconds between echoed progress updates from one git command
+PROGRESS_INTERVAL = 2.0
+
+# Output comes from several threads, so serialize it to keep lines intact
+_print_lock = threading.Lock()
+
+
+def log(text: str = ""):
+    """Print a line without interleaving with other threads' output."""
+    with _print_lock:
+        print(text, flush=True)
 
 
 class GitSubtreeManager:
@@ -30,23 +47,141 @@ class GitSubtreeManager:
         self.repo_root = repo_root
         self.config_file = repo_root / "subtrees.toml"
 
-    def run_command(self, cmd: List[str], cwd: Optional[Path] = None) -> tuple[int, str, str]:
-        """Run a command and return exit code, stdout, and stderr."""
+    def run_command(self, cmd: List[str], cwd: Optional[Path] = None,
+                    echo: bool = True, label: str = "") -> tuple[int, str, str]:
+        """
+        Run a command and return exit code, stdout, and stderr.
+
+        Output is echoed line by line as it arrives (unless echo is False), so
+        callers that echo don't need to print stderr again. Carriage-return
+        progress updates (git fetch --progress) are echoed at most every
+        PROGRESS_INTERVAL seconds and left out of the returned output.
+        A label tags each echoed line, for commands running side by side.
+        """
+        tag = f"[{label}] " if label else ""
         try:
-            result = subprocess.run(
+            process = subprocess.Popen(
                 cmd,
                 cwd=cwd or self.repo_root,
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                # Fail instead of hanging forever on a credential prompt
+                env={**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
             )
-            return result.returncode, result.stdout, result.stderr
         except Exception as e:
+            if echo:
+                log(f"    {tag}{e}")
             return 1, "", str(e)
 
+        # Drain both pipes at once so neither fills up and blocks the child.
+        # Threads rather than selectors, which can't wait on pipes on Windows.
+        stdout_lines: List[str] = []
+        stderr_lines: List[str] = []
+        readers = [
+            threading.Thread(target=self._pump_output, args=(process.stdout, stdout_lines, echo, tag)),
+            threading.Thread(target=self._pump_output, args=(process.stderr, stderr_lines, echo, tag)),
+        ]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+
+        returncode = process.wait()
+        return returncode, "".join(stdout_lines), "".join(stderr_lines)
+
+    @staticmethod
+    def _pump_output(stream, lines: List[str], echo: bool, tag: str):
+        """Collect lines from a child process pipe, echoing them if requested."""
+        # newline='' splits on '\r' as well as '\n' and keeps the ending, so
+        # progress updates can be told apart from finished lines
+        last_progress = 0.0
+        with io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline='') as text:
+            for line in text:
+                if line.endswith('\r'):
+                    now = time.monotonic()
+                    if echo and now - last_progress >= PROGRESS_INTERVAL:
+                        last_progress = now
+                        log(f"    {tag}{line.rstrip()}")
+                    continue
+
+                lines.append(line)
+                if echo:
+                    log(f"    {tag}{line.rstrip()}")
+
+    def add_remote(self, name: str, remote: str) -> tuple[bool, str]:
+        """Add a remote unless it already exists. Returns success and error text."""
+        if pygit2 is not None:
+            try:
+                pygit2.Repository(str(self.repo_root)).remotes.create(name, remote)
+            except ValueError:
+                pass  # Remote already exists
+            except pygit2.GitError as e:
+                return False, str(e)
+            return True, ""
+
+        # Not echoed: "already exists" is expected and any other error is returned
+        returncode, _, stderr = self.run_command([
+            "git", "remote", "add", name, remote
+        ], echo=False)
+        if returncode != 0 and "already exists" not in stderr:
+            return False, stderr
+        return True, ""
+
+    @staticmethod
+    def fetched_ref(name: str) -> str:
+        """Local ref that holds the commit fetched for a subtree."""
+        return f"refs/subtrees/{name}"
+
+    def fetch(self, name: str, ref: str, shallow: bool = False) -> tuple[bool, str]:
+        """
+        Fetch a ref from a remote into fetched_ref(name). Returns success and error
+        text, which is empty when git has already printed its own error.
+
+        Each subtree gets its own destination ref (and FETCH_HEAD is left alone),
+        so fetches for different subtrees can run concurrently. With shallow=True
+        only the tip commit is fetched, which is all a squashed subtree add needs.
+        That marks the whole repository shallow (.git/shallow), and shallow
+        fetches can't run concurrently since they all rewrite that file.
+        """
+        refspec = f"+{ref}:{self.fetched_ref(name)}"
+
+        was_shallow = shallow and self.is_shallow()
+        success, error = self._fetch_refspec(name, refspec, shallow)
+
+        if success and shallow and not was_shallow and self.is_shallow():
+            log(f"[NOTE] Only the latest commit of '{name}' was fetched, which marks this repository")
+            log(f"       as shallow. Run 'git fetch --unshallow {name}' to fetch its full history.")
+        return success, error
+
+    def is_shallow(self) -> bool:
+        """Check if the repository has shallow (history-truncated) commits."""
+        _, stdout, _ = self.run_command(["git", "rev-parse", "--is-shallow-repository"], echo=False)
+        return stdout.strip() == "true"
+
+    def _fetch_refspec(self, name: str, refspec: str, shallow: bool) -> tuple[bool, str]:
+        """Run a single fetch of refspec from the named remote."""
+        if pygit2 is not None:
+            options = {"depth": 1} if shallow else {}
+            try:
+                pygit2.Repository(str(self.repo_root)).remotes[name].fetch([refspec], **options)
+            except (TypeError, KeyError, pygit2.GitError):
+                # Fall back to the git CLI: libgit2 doesn't use git's credential
+                # helpers, SSH agent or proxy settings, and pygit2 before 1.15 has
+                # no depth argument. A genuine error is then reported by git itself.
+                pass
+            else:
+                return True, ""
+
+        # Git only reports progress to a terminal unless asked to
+        cmd = ["git", "fetch", "--progress", "--no-write-fetch-head"]
+        if shallow:
+            cmd += ["--depth", "1"]
+        returncode, _, _ = self.run_command(cmd + [name, refspec], label=name)
+        return returncode == 0, ""
+
     def check_git_repo(self) -> bool:
         """Check if the current directory is a git repository."""
-        returncode, _, _ = self.run_command(["git", "rev-parse", "--git-dir"])
+        returncode, _, _ = self.run_command(["git", "rev-parse", "--git-dir"], echo=False)
         return returncode == 0
 
     def load_config(self) -> Dict:
@@ -58,8 +193,7 @@ class GitSubtreeManager:
             return self.load_config()
 
         try:
-            with open(self.config_file, 'rb') as f:
-                return tomllib.load(f)
+            return load_toml(self.config_file)
         except Exception as e:
             print(f"[ERROR] Invalid TOML in configuration file: {e}")
             sys.exit(1)
@@ -93,8 +227,8 @@ enabled = false
         print(f"[OK] Created example configuration at: {self.config_file}")
         print("     Edit this file to add your dependencies.")
 
-    def add_subtree(self, name: str, remote: str, prefix: str, ref: str = "main"):
-        """Add a git subtree for a remote dependency."""
+    def _prepare_add(self, name: str, remote: str, prefix: str, ref: str) -> bool:
+        """Check a subtree can be added and make sure its remote exists."""
         print(f"\n--- Adding subtree: {name} ---")
         print(f"  Remote: {remote}")
         print(f"  Prefix: {prefix}")
@@ -109,42 +243,16 @@ enabled = false
 
         # Add remote if it doesn't exist
         print(f"\nAdding remote '{name}'...")
-        returncode, stdout, stderr = self.run_command([
-            "git", "remote", "add", name, remote
-        ])
-
-        if returncode != 0 and "already exists" not in stderr:
-            print(f"[ERROR] Failed to add remote: {stderr}")
-            return False
-
-        # Fetch from remote
-        print(f"Fetching from remote '{name}'...")
-        returncode, stdout, stderr = self.run_command([
-            "git", "fetch", name, ref
-        ])
-
-        if returncode != 0:
-            print(f"[ERROR] Failed to fetch from remote: {stderr}")
-            return False
-
-        # Add subtree
-        print(f"Adding subtree to '{prefix}'...")
-        returncode, stdout, stderr = self.run_command([
-            "git", "subtree", "add",
-            "--prefix", prefix,
-            name, ref,
-            "--squash"
-        ])
+        success, error = self.add_remote(name, remote)
 
-        if returncode != 0:
-            print(f"[ERROR] Failed to add subtree: {stderr}")
+        if not success:
+            print(f"[ERROR] Failed to add remote: {error}")
             return False
 
-        print(f"[OK] Successfully added subtree '{name}'")
         return True
 
-    def update_subtree(self, name: str, prefix: str, ref: str = "main"):
-        """Update an existing git subtree."""
+    def _prepare_update(self, name: str, prefix: str, ref: str) -> bool:
+        """Check an existing subtree can be updated."""
         print(f"\n--- Updating subtree: {name} ---")
         print(f"  Prefix: {prefix}")
         print(f"  Ref: {ref}")
@@ -156,32 +264,67 @@ enabled = false
             print("          Use add to create the subtree first.")
             return False
 
-        # Fetch from remote
-        print(f"Fetching from remote '{name}'...")
-        returncode, stdout, stderr = self.run_command([
-            "git", "fetch", name, ref
-        ])
+        return True
 
-        if returncode != 0:
-            print(f"[ERROR] Failed to fetch from remote: {stderr}")
+    def _fetch_phase(self, name: str, ref: str, shallow: bool = False) -> bool:
+        """
+        Fetch a subtree's ref. Safe to run concurrently for different subtrees,
+        as long as they aren't shallow.
+        """
+        log(f"Fetching from remote '{name}'...")
+        success, error = self.fetch(name, ref, shallow=shallow)
+
+        if not success:
+            log(f"[ERROR] Failed to fetch '{name}' from remote" + (f": {error}" if error else ""))
             return False
 
-        # Pull subtree updates
-        print(f"Pulling updates for subtree '{prefix}'...")
-        returncode, stdout, stderr = self.run_command([
-            "git", "subtree", "pull",
+        return True
+
+    def _merge_phase(self, name: str, prefix: str, update: bool) -> bool:
+        """
+        Add or merge the fetched commit into the working tree.
+
+        This modifies the index and working tree, so it must run serially.
+        """
+        if update:
+            print(f"Merging updates for subtree '{prefix}'...")
+            action = "merge"
+        else:
+            print(f"Adding subtree to '{prefix}'...")
+            action = "add"
+
+        returncode, _, _ = self.run_command([
+            "git", "subtree", action,
             "--prefix", prefix,
-            name, ref,
+            self.fetched_ref(name),
             "--squash"
         ])
 
+        # git's own error has already been echoed above
         if returncode != 0:
-            print(f"[ERROR] Failed to update subtree: {stderr}")
+            print(f"[ERROR] Failed to {'update' if update else 'add'} subtree '{name}'")
             return False
 
-        print(f"[OK] Successfully updated subtree '{name}'")
+        print(f"[OK] Successfully {'updated' if update else 'added'} subtree '{name}'")
         return True
 
+    def add_subtree(self, name: str, remote: str, prefix: str, ref: str = "main"):
+        """
+        Add a git subtree for a remote dependency.
+
+        The add is squashed, so the remote's history would be thrown away and
+        only the tip is fetched.
+        """
+        return (self._prepare_add(name, remote, prefix, ref)
+                and self._fetch_phase(name, ref, shallow=True)
+                and self._merge_phase(name, prefix, update=False))
+
+    def update_subtree(self, name: str, prefix: str, ref: str = "main"):
+        """Update an existing git subtree."""
+        return (self._prepare_update(name, prefix, ref)
+                and self._fetch_phase(name, ref)
+                and self._merge_phase(name, prefix, update=True))
+
     def setup_all_subtrees(self, update: bool = False):
         """Set up all subtrees defined in the configuration."""
         config = self.load_config()
@@ -199,7 +342,8 @@ enabled = false
 
         print(f"\nFound {len(enabled_subtrees)} enabled subtree(s) to process")
 
-        success_count = 0
+        # Checks and remote setup touch .git/config, so they run serially
+        ready = []
         for subtree in enabled_subtrees:
             name = subtree.get("name")
             remote = subtree.get("remote")
@@ -211,10 +355,31 @@ enabled = false
                 continue
 
             if update:
-                if self.update_subtree(name, prefix, ref):
-                    success_count += 1
+                prepared = self._prepare_update(name, prefix, ref)
             else:
-                if self.add_subtree(name, remote, prefix, ref):
+                prepared = self._prepare_add(name, remote, prefix, ref)
+
+            if prepared:
+                ready.append((name, prefix, ref))
+
+        # Fetches are independent network round trips, so overlap them. A single
+        # add fetches shallow instead, since its squash discards the history;
+        # shallow fetches can't overlap, and updates need the history between
+        # the previous and new upstream commits.
+        shallow = not update and len(ready) == 1
+        if ready:
+            print()
+            with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+                fetched = list(executor.map(lambda s: self._fetch_phase(s[0], s[2], shallow), ready))
+        else:
+            fetched = []
+
+        # Subtree add/merge rewrites the working tree, so those run one at a time
+        success_count = 0
+        for (name, prefix, ref), ok in zip(ready, fetched):
+            if ok:
+                print()
+                if self._merge_phase(name, prefix, update):
                     success_count += 1
 
         print(f"\n{'=' * 60}")